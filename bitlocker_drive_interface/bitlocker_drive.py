@@ -5,10 +5,14 @@
 This module contains the BitlockerDrive class, which is used to unlock and lock Bitlocker drives.
 """
 
-import os
+import sys
+import base64
+import shutil
+import asyncio
 import logging
+import functools
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Tuple, Union
 
 from bitlocker_drive_interface.utilities import utilities
 from bitlocker_drive_interface.utilities.exceptions import (AlreadyLockedError, AlreadyUnlockedError)
@@ -18,115 +22,553 @@ from bitlocker_drive_interface.utilities.exceptions import (AlreadyLockedError,
 # Sets up logger
 logger = logging.getLogger(__name__)
 
+#: Flags that skip profile loading and interactive host setup, which dominate PowerShell startup.
+POWERSHELL_STARTUP_FLAGS = ["-NoProfile", "-NonInteractive", "-NoLogo", "-ExecutionPolicy", "Bypass"]
+
+#: PowerShell expression reading the password from stdin. Read-Host is unavailable with -NonInteractive.
+#: Redirected stdin is decoded with the console code page, so the password arrives as Base64 encoded UTF-16LE.
+PASSWORD_FROM_STDIN = "[Text.Encoding]::Unicode.GetString([Convert]::FromBase64String([Console]::In.ReadLine()))"
+
+#: Native Bitlocker command line tool, which starts much faster than a PowerShell host.
+MANAGE_BDE_EXECUTABLE = "manage-bde.exe"
+
+#: Maps every character PowerShell treats as a single quote to its doubled, escaped form.
+_SINGLE_QUOTE_ESCAPES = {ord(quote): quote * 2 for quote in "'\u2018\u2019\u201a\u201b"}
+
+
+# **********
+def _quote_powershell_string(value: str) -> str:
+    """Quotes a value as a verbatim PowerShell string literal, so quotes, `$` and backticks are not interpreted.
+    
+    PowerShell also accepts the typographic single quotes U+2018 to U+201B as string delimiters, so they are doubled
+    like `'`, matching its own ``EscapeSingleQuotedStringContent``.
+
+    Args:
+        value (str): Value to quote.
+
+    Returns:
+        str: Single-quoted PowerShell string literal.
+    """
+    return "'" + value.translate(_SINGLE_QUOTE_ESCAPES) + "'"
+
+
+def _encode_powershell_command(script: str) -> str:
+    """Encodes a script for PowerShell's `-EncodedCommand` parameter.
+
+    Args:
+        script (str): PowerShell script.
+
+    Returns:
+        str: Base64 encoded UTF-16LE script.
+    """
+    return base64.b64encode(script.encode("utf-16-le")).decode()
+
+
+@functools.lru_cache(maxsize=1)
+def _default_powershell() -> Optional[Path]:
+    """Finds the PowerShell executable on PATH, preferring PowerShell 7+ (``pwsh``) over Windows PowerShell.
+    
+    Cached so PATH is only searched once per process, however many drives are created.
+
+    Returns:
+        Optional[Path]: Path to the PowerShell executable, or None if none is found.
+    """
+    found_executable = shutil.which("pwsh") or shutil.which("powershell")
+    return Path(found_executable) if found_executable is not None else None
+
 
 # **********
 class BitlockerDrive:
     """Represents a Bitlocker drive that can be unlocked or locked."""
     
-    def __init__(self, powershell_executable_path: Path, mount_point: Path) -> None:
+    __slots__ = (
+        "_powershell_executable_path",
+        "_mount_point",
+        "_use_powershell",
+        "_use_wmi",
+        "subprocess_unlock_command",
+        "subprocess_lock_command",
+        "_host_process",
+        "_host_lock",
+        "_unlock_command",
+        "_lock_command",
+        "_ps_str",
+        "_mp_str",
+    )
+    
+    def __init__(
+        self,
+        powershell_executable_path: Optional[Path],
+        mount_point: Path,
+        use_powershell: bool = True,
+        use_wmi: bool = False
+    ) -> None:
         """Instantiates a new BitlockerDrive object.
+        
+        If no PowerShell executable is given, PowerShell 7+ (``pwsh``) is preferred over Windows PowerShell
+        (``powershell``) since its startup is considerably faster, which dominates the runtime of a single cmdlet call.
 
         Args:
-            powershell_executable_path (Path): Path to the PowerShell executable.
+            powershell_executable_path (Optional[Path]): Path to the PowerShell executable, or None to detect it
+                from PATH.
             mount_point (Path): Path to the mount point of the Bitlocker drive
+            use_powershell (bool, optional): Whether to use the PowerShell Bitlocker cmdlets rather than the native
+                manage-bde tool, which skips the PowerShell startup entirely. Defaults to True.
+            use_wmi (bool, optional): Whether to call the Bitlocker WMI provider directly instead of running any
+                subprocess. Requires pywin32 (the `wmi` extra) and takes precedence over `use_powershell`.
+                Defaults to False.
+
+        Raises:
+            FileNotFoundError: If PowerShell is used, no executable is given, and none is found on PATH.
         """
-        self.powershell_executable_path = powershell_executable_path
-        self.mount_point = mount_point
+        if powershell_executable_path is None and use_powershell and not use_wmi:
+            powershell_executable_path = _default_powershell()
+            if powershell_executable_path is None:
+                raise FileNotFoundError("No PowerShell executable found on PATH.")
+            logger.info("Using PowerShell executable at %s", powershell_executable_path)
+        
+        #: The configuration is read-only, since the cached commands below are built from it.
+        self._powershell_executable_path = powershell_executable_path
+        self._mount_point = mount_point
+        self._use_powershell = use_powershell
+        self._use_wmi = use_wmi
+        
+        #: String forms of the paths, converted once since they are used in every command and script.
+        self._ps_str = str(powershell_executable_path) if powershell_executable_path is not None else None
+        self._mp_str = str(mount_point)
         
         #: Command to unlock the Bitlocker drive.
         self.subprocess_unlock_command: Optional[List[str]] = None
         
         #: Command to lock the Bitlocker drive.
         self.subprocess_lock_command: Optional[List[str]] = None
+        
+        #: Persistent PowerShell host reused by unlock/lock calls, if started.
+        self._host_process: Optional[asyncio.subprocess.Process] = None
+        
+        #: Serializes scripts submitted to the persistent PowerShell host.
+        self._host_lock = asyncio.Lock()
+        
+        #: Commands only depend on the executable and mount point, so they are built once rather than per call.
+        #: WMI runs no subprocess, so it has none.
+        self._unlock_command: Optional[List[str]] = None if use_wmi else self._build_unlock_command()
+        self._lock_command: Optional[List[str]] = None if use_wmi else self._build_lock_command()
+    
+    
+    @property
+    def powershell_executable_path(self) -> Optional[Path]:
+        """Path to the PowerShell executable, or None if PowerShell is not used."""
+        return self._powershell_executable_path
+    
+    @property
+    def mount_point(self) -> Path:
+        """Path to the mount point of the Bitlocker drive."""
+        return self._mount_point
+    
+    @property
+    def use_powershell(self) -> bool:
+        """Whether the PowerShell Bitlocker cmdlets are used rather than manage-bde."""
+        return self._use_powershell
+    
+    @property
+    def use_wmi(self) -> bool:
+        """Whether the Bitlocker WMI provider is called directly."""
+        return self._use_wmi
+    
+    
+    async def start_host(self) -> None:
+        """Starts a persistent PowerShell host that is reused by subsequent unlock/lock calls.
+        
+        Without a host, every call spawns a new PowerShell process and pays its full startup cost.
+
+        Raises:
+            RuntimeError: If the drive does not use PowerShell.
+        """
+        if not self.use_powershell or self.use_wmi:
+            raise RuntimeError("The persistent host requires PowerShell.")
+        
+        async with self._host_lock:
+            # Checked under the lock, so concurrent calls start a single host
+            if self._host_process is not None:
+                return
+            
+            logger.info("Starting PowerShell host at %s", self.powershell_executable_path)
+            self._host_process = await asyncio.create_subprocess_exec(
+                self._ps_str,
+                *POWERSHELL_STARTUP_FLAGS,
+                "-Command",
+                "-",  # Reads commands from stdin
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT
+            )
+    
+    
+    async def close_host(self) -> None:
+        """Closes the persistent PowerShell host, if started. Later calls spawn PowerShell per call again."""
+        async with self._host_lock:
+            # Checked under the lock, as a concurrent call may have closed the host while this one waited
+            if self._host_process is None:
+                return
+            
+            logger.info("Closing PowerShell host")
+            process, self._host_process = self._host_process, None
+            process.stdin.write(b"exit\n")
+            await process.stdin.drain()
+            process.stdin.close()
+            await process.wait()
+    
+    
+    def _unlock_script(self, password_expression: str) -> str:
+        """Builds the PowerShell script to unlock the Bitlocker drive.
+
+        Args:
+            password_expression (str): PowerShell expression evaluating to the password.
+
+        Returns:
+            str: Single-line PowerShell script.
+        """
+        # Converts password to secure string and unlocks drive
+        return f'$securePassword = ConvertTo-SecureString -String ({password_expression}) -AsPlainText -Force; ' \
+            f'Unlock-BitLocker -MountPoint {_quote_powershell_string(self._mp_str)} -Password $securePassword'
+    
+    
+    def _lock_script(self) -> str:
+        """Builds the PowerShell script to lock the Bitlocker drive.
+
+        Returns:
+            str: Single-line PowerShell script.
+        """
+        return f'Lock-BitLocker -MountPoint {_quote_powershell_string(self._mp_str)} -ForceDismount'
+    
+    
+    def _build_unlock_command(self) -> List[str]:
+        """Builds the command to unlock the Bitlocker drive, which reads the password from stdin.
+        
+        PowerShell scripts are passed pre-encoded, so they are encoded once per drive rather than per call.
+
+        Returns:
+            List[str]: Command to unlock the Bitlocker drive.
+        """
+        if self.use_powershell:
+            return [
+                self._ps_str,
+                *POWERSHELL_STARTUP_FLAGS,
+                "-EncodedCommand",
+                _encode_powershell_command(self._unlock_script(PASSWORD_FROM_STDIN))
+            ]
+        # Prompts for the password
+        return [MANAGE_BDE_EXECUTABLE, "-unlock", self._mp_str, "-password"]
+    
+    
+    def _build_lock_command(self) -> List[str]:
+        """Builds the command to lock the Bitlocker drive.
+
+        Returns:
+            List[str]: Command to lock the Bitlocker drive.
+        """
+        if self.use_powershell:
+            return [
+                self._ps_str,
+                *POWERSHELL_STARTUP_FLAGS,
+                "-EncodedCommand",
+                _encode_powershell_command(self._lock_script())
+            ]
+        return [MANAGE_BDE_EXECUTABLE, "-lock", self._mp_str, "-ForceDismount"]
+    
+    
+    def _password_stdin_data(self, password: str) -> bytes:
+        """Encodes the password for the stdin of the unlock command.
+        
+        The PowerShell command decodes it from Base64 encoded UTF-16LE, which is unaffected by the console code page.
+        manage-bde reads it in the OEM code page, like a password typed at its prompt.
+
+        Args:
+            password (str): Password to unlock the Bitlocker drive.
+
+        Returns:
+            bytes: Password line to write to stdin.
+        """
+        if self.use_powershell:
+            return base64.b64encode(password.encode("utf-16-le")) + b"\n"
+        return f"{password}\n".encode("oem" if sys.platform == "win32" else "utf-8")
+    
+    
+    async def _run_in_host(self, script: str, print_output: bool) -> bool:
+        """Runs a script in the persistent PowerShell host, one script at a time.
+
+        Args:
+            script (str): Single-line PowerShell script.
+            print_output (bool): Whether to print the output to the console.
+
+        Returns:
+            bool: Whether the script ran, i.e. False if no host is running.
+        """
+        async with self._host_lock:
+            # Checked under the lock, as close_host may have run while this call waited
+            if self._host_process is None:
+                return False
+            await utilities.run_host_script(self._host_process, script, print_output=print_output)
+        return True
+    
+    
+    def _state(self) -> utilities.BitlockerState:
+        """Queries the current state of the Bitlocker drive without raising.
+
+        Returns:
+            utilities.BitlockerState: State of the drive.
+        """
+        return utilities.query_bitlocker_state(self.mount_point)
+    
+    
+    def _check_state(self, expect_mounted: bool) -> None:
+        """Checks that the Bitlocker drive is in the expected state before unlocking or locking it.
+
+        Args:
+            expect_mounted (bool): Whether the drive is expected to be mounted (i.e. unlocked).
+
+        Raises:
+            FileNotFoundError: If the mount point is not found.
+            AlreadyUnlockedError: If the drive is expected to be locked but is already unlocked.
+            AlreadyLockedError: If the drive is expected to be unlocked but is already locked.
+        """
+        state = self._state()
+        if state == "absent":
+            raise FileNotFoundError(f"Mount point at {self.mount_point} not found.")
+        if state == "unlocked" and not expect_mounted:
+            raise AlreadyUnlockedError(f"Mount point at {self.mount_point} is already mounted.")
+        if state == "locked" and expect_mounted:
+            raise AlreadyLockedError(f"Mount point at {self.mount_point} is already dismounted")
     
     
     def prepare_unlock_subprocess(self, password: str) -> List[str]:
         """Prepares the command to unlock the Bitlocker drive.
         
+        The password is not part of the command, which would expose it in the process list.
+        The command reads it from stdin instead.
+        
         Args:
             password (str): Password to unlock the Bitlocker drive.
 
         Raises:
-            FileNotFoundError: If the password file for the Bitlocker drive is not found.
+            RuntimeError: If the drive uses WMI, which runs no subprocess.
+            FileNotFoundError: If the mount point is not found.
+            AlreadyUnlockedError: If the Bitlocker drive is already unlocked.
 
         Returns:
             List[str]: Command to unlock the Bitlocker drive.
         """
-        if not os.path.ismount(self.mount_point):
-            raise FileNotFoundError(f"Mount point at {self.mount_point} not found.")
-        if utilities.is_mounted(self.mount_point):
-            raise AlreadyUnlockedError(f"Mount point at {self.mount_point} is already mounted.")
-        
-        logger.info(f"Preparing to unlock Bitlocker drive at {self.mount_point}")
+        if self.use_wmi:
+            raise RuntimeError("Drives using WMI do not run an unlock subprocess.")
+        self._check_state(expect_mounted=False)
         
-        # Command to convert password to secure string and unlock drive
-        command = [
-            f"{self.powershell_executable_path}",
-            "-Command",
-            f'$securePassword = ConvertTo-SecureString -String "{password}" -AsPlainText -Force; \
-                Unlock-BitLocker -MountPoint "{self.mount_point}" -Password $securePassword'
-        ]
+        logger.info("Preparing to unlock Bitlocker drive at %s", self.mount_point)
         
-        self.subprocess_unlock_command = command
+        self.subprocess_unlock_command = list(self._unlock_command)
         
         return self.subprocess_unlock_command
     
     
     async def unlock(self, password: str, print_output: bool = True) -> None:
-        """Unlocks the Bitlocker drive.
+        """Unlocks the Bitlocker drive. Runs in the persistent PowerShell host if one was started.
+        
+        With WMI, the state is checked directly and the unlock runs in the default executor, as it blocks.
 
         Args:
+            password (str): Password to unlock the Bitlocker drive.
             print_output (bool, optional): Whether to print the output to the console. Defaults to True.
         """
-        self.prepare_unlock_subprocess(password)
-        logger.info(f"Unlocking Bitlocker drive at {self.mount_point}")
+        if self.use_wmi:
+            self._check_state(expect_mounted=False)
+        else:
+            self.prepare_unlock_subprocess(password)
         try:
-            await utilities.run_command(self.subprocess_unlock_command, print_output=print_output)
+            await self._execute_unlock(password, print_output)
         except RuntimeError as e:
-            logger.error(f"Error running unlock command: {str(e)}")
+            logger.error("Error running unlock command: %s", e)
+    
+    
+    async def ensure_unlocked(self, password: str, print_output: bool = True) -> bool:
+        """Unlocks the Bitlocker drive unless it is already unlocked, which is reported rather than raised.
+
+        Args:
+            password (str): Password to unlock the Bitlocker drive.
+            print_output (bool, optional): Whether to print the output to the console. Defaults to True.
+
+        Raises:
+            FileNotFoundError: If the mount point is not found.
+            RuntimeError: If the unlock fails, e.g. due to a wrong password.
+
+        Returns:
+            bool: Whether an unlock was performed, i.e. False if the drive was already unlocked.
+        """
+        state = self._state()
+        if state == "absent":
+            raise FileNotFoundError(f"Mount point at {self.mount_point} not found.")
+        if state == "unlocked":
+            return False
+        
+        if not self.use_wmi:
+            self.subprocess_unlock_command = list(self._unlock_command)
+        await self._execute_unlock(password, print_output)
+        return True
+    
+    
+    async def _execute_unlock(self, password: str, print_output: bool) -> None:
+        """Runs the unlock through the configured backend once the drive's state has been checked.
+
+        Args:
+            password (str): Password to unlock the Bitlocker drive.
+            print_output (bool): Whether to print the output to the console.
+
+        Raises:
+            RuntimeError: If the unlock fails.
+        """
+        logger.info("Unlocking Bitlocker drive at %s", self.mount_point)
+        if self.use_wmi:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, utilities.bitlocker_wmi_unlock, self.mount_point, password)
+            return
+        
+        # The host reads its commands from stdin, so the password is passed as a quoted literal instead
+        ran_in_host = self._host_process is not None and await self._run_in_host(
+            self._unlock_script(_quote_powershell_string(password)), print_output
+        )
+        if not ran_in_host:
+            await utilities.run_command(
+                self.subprocess_unlock_command,
+                print_output=print_output,
+                stdin_data=self._password_stdin_data(password)
+            )
     
     
     def prepare_lock_subprocess(self) -> List[str]:
         """Prepares the command to lock the Bitlocker drive.
 
         Raises:
-            FileNotFoundError: If the Bitlocker drive is not mounted.
+            RuntimeError: If the drive uses WMI, which runs no subprocess.
+            FileNotFoundError: If the mount point is not found.
+            AlreadyLockedError: If the Bitlocker drive is already locked.
 
         Returns:
             List[str]: Command to lock the Bitlocker drive.
         """
-        if not os.path.ismount(self.mount_point):
-            raise FileNotFoundError(f"Mount point at {self.mount_point} not found.")
-        if not utilities.is_mounted(self.mount_point):
-            raise AlreadyLockedError(f"Mount point at {self.mount_point} is already dismounted")
+        if self.use_wmi:
+            raise RuntimeError("Drives using WMI do not run a lock subprocess.")
+        self._check_state(expect_mounted=True)
         
-        logger.info(f"Preparing to lock Bitlocker drive at {self.mount_point}")
+        logger.info("Preparing to lock Bitlocker drive at %s", self.mount_point)
         
-        # Command to lock drive
-        command = [
-            f"{self.powershell_executable_path}",
-            "-Command",
-            f'Lock-BitLocker -MountPoint "{self.mount_point}" -ForceDismount'
-        ]
-        
-        self.subprocess_lock_command = command
+        self.subprocess_lock_command = list(self._lock_command)
         
         return self.subprocess_lock_command
     
     
     async def lock(self, print_output: bool = True) -> None:
-        """Locks the Bitlocker drive.
+        """Locks the Bitlocker drive. Runs in the persistent PowerShell host if one was started.
+        
+        With WMI, the state is checked directly and the lock runs in the default executor, as it blocks.
 
         Args:
             print_output (bool, optional): Whether to print the output to the console. Defaults to True.
         """
-        self.prepare_lock_subprocess()
-        logger.info(f"Locking Bitlocker drive at {self.mount_point}")
+        if self.use_wmi:
+            self._check_state(expect_mounted=True)
+        else:
+            self.prepare_lock_subprocess()
         try:
-            await utilities.run_command(self.subprocess_lock_command, print_output=print_output)
+            await self._execute_lock(print_output)
         except RuntimeError as e:
-            logger.error(f"Error running lock command: {str(e)}")
+            logger.error("Error running lock command: %s", e)
+    
+    
+    async def ensure_locked(self, print_output: bool = True) -> bool:
+        """Locks the Bitlocker drive unless it is already locked, which is reported rather than raised.
+
+        Args:
+            print_output (bool, optional): Whether to print the output to the console. Defaults to True.
 
+        Raises:
+            FileNotFoundError: If the mount point is not found.
+            RuntimeError: If the lock fails.
+
+        Returns:
+            bool: Whether a lock was performed, i.e. False if the drive was already locked.
+        """
+        state = self._state()
+        if state == "absent":
+            raise FileNotFoundError(f"Mount point at {self.mount_point} not found.")
+        if state == "locked":
+            return False
+        
+        if not self.use_wmi:
+            self.subprocess_lock_command = list(self._lock_command)
+        await self._execute_lock(print_output)
+        return True
+    
+    
+    async def _execute_lock(self, print_output: bool) -> None:
+        """Runs the lock through the configured backend once the drive's state has been checked.
+
+        Args:
+            print_output (bool): Whether to print the output to the console.
+
+        Raises:
+            RuntimeError: If the lock fails.
+        """
+        logger.info("Locking Bitlocker drive at %s", self.mount_point)
+        if self.use_wmi:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, utilities.bitlocker_wmi_lock, self.mount_point)
+            return
+        
+        ran_in_host = self._host_process is not None and await self._run_in_host(self._lock_script(), print_output)
+        if not ran_in_host:
+            await utilities.run_command(self.subprocess_lock_command, print_output=print_output)
+    
+    
+    @classmethod
+    async def unlock_many(
+        cls,
+        pairs: List[Tuple["BitlockerDrive", str]],
+        print_output: bool = False
+    ) -> List[Union[bool, BaseException]]:
+        """Unlocks several Bitlocker drives concurrently.
+        
+        Each unlock waits on its own subprocess, so for drives on independent devices the total time is close to
+        that of the slowest drive rather than the sum of all of them. A failing drive does not stop the others; its
+        exception is returned in place of its result instead.
+
+        Args:
+            pairs (List[Tuple[BitlockerDrive, str]]): Drives to unlock, each with its password.
+            print_output (bool, optional): Whether to print the output to the console. Defaults to False.
+
+        Returns:
+            List[Union[bool, BaseException]]: Per drive, in order, the result of `ensure_unlocked` or the exception
+                it raised.
+        """
+        return await asyncio.gather(
+            *(drive.ensure_unlocked(password, print_output) for drive, password in pairs),
+            return_exceptions=True,
+        )
+    
+    
+    @classmethod
+    async def lock_many(cls, drives: List["BitlockerDrive"], print_output: bool = False) -> List[Union[bool, BaseException]]:
+        """Locks several Bitlocker drives concurrently. See `unlock_many`.
+
+        Args:
+            drives (List[BitlockerDrive]): Drives to lock.
+            print_output (bool, optional): Whether to print the output to the console. Defaults to False.
+
+        Returns:
+            List[Union[bool, BaseException]]: Per drive, in order, the result of `ensure_locked` or the exception
+                it raised.
+        """
+        return await asyncio.gather(
+            *(drive.ensure_locked(print_output) for drive in drives),
+            return_exceptions=True,
+        )
 
 # **********
 if __name__ == "__main__":
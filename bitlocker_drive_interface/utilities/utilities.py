@@ -6,16 +6,44 @@ This module holds utilities used by other modules.
 """
 
 import os
-import string
-import asyncio
+import sys
+import stat
+import ctypes
+import base64
 import logging
+import functools
+import threading
+import subprocess
 from pathlib import Path
-from typing import Set, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Set, List, Literal, Optional, Callable, BinaryIO, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import asyncio
 
 # **********
 # Sets up logger
 logger = logging.getLogger(__name__)
 
+#: Drive letters in order, i.e. the letter for bit i of a Windows logical drive mask is DRIVE_LETTERS[i].
+DRIVE_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+#: State of a Bitlocker drive: mount point not found, present but locked, or unlocked and accessible.
+BitlockerState = Literal["absent", "locked", "unlocked"]
+
+#: Windows error code returned when querying a volume that is locked by Bitlocker.
+ERROR_ACCESS_DENIED = 5
+
+#: Buffer length for a volume GUID path such as `\\?\Volume{GUID}\`, as recommended by the Windows API docs.
+VOLUME_NAME_LENGTH = 50
+
+#: WMI namespace of the Bitlocker provider.
+WMI_BITLOCKER_NAMESPACE = r"root\cimv2\Security\MicrosoftVolumeEncryption"
+
+#: Spawns subprocesses off the event loop, avoiding the slow subprocess bootstrap of asyncio (bpo-37263).
+#: Shared across calls so the worker thread is only created once.
+_SPAWN_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="run_command_spawn")
+
 # **********
 def available_drive_letters() -> Set[str]:
     """Fetches a set of available drive letters for the system.
@@ -24,11 +52,17 @@ def available_drive_letters() -> Set[str]:
         Set[str]: Set of available drive letters.
     """
     logger.info("Fetching available drive letters.")
-    return {letter for letter in string.ascii_uppercase if not os.path.exists(letter + ":\\")}
+    if sys.platform == "win32":
+        # Bit i of the mask is set if drive letter A+i is in use
+        drive_mask = ctypes.windll.kernel32.GetLogicalDrives()
+        return {letter for i, letter in enumerate(DRIVE_LETTERS) if not (drive_mask >> i) & 1}
+    return {letter for letter in DRIVE_LETTERS if not os.path.exists(letter + ":\\")}
 
 
 def is_mounted(path: Path) -> bool:
-    """Checks if a path is exists and is a mount for a file system.
+    """Checks if a path exists and is an accessible directory, i.e. its file system is mounted.
+    
+    Uses a single stat call, since a locked Bitlocker drive fails to stat while an unlocked one succeeds.
 
     Args:
         path (Path): Path to check.
@@ -36,33 +70,299 @@ def is_mounted(path: Path) -> bool:
     Returns:
         bool: Whether the path is mounted.
     """
-    logger.info(f"Checking if path is mounted: {path}")
-    return os.path.ismount(path) and path.exists()
+    logger.info("Checking if path is mounted: %s", path)
+    try:
+        return stat.S_ISDIR(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def _volume_root(path: Path) -> str:
+    """Formats a mount point as the root path expected by the Windows volume APIs, i.e. with a trailing separator.
+    
+    A bare drive such as `E:` becomes `E:\\`, which joining with an empty component would leave unchanged.
+
+    Args:
+        path (Path): Mount point.
+
+    Returns:
+        str: Mount point ending in a separator.
+    """
+    volume_root = os.fspath(path)
+    if not volume_root.endswith(("\\", "/")):
+        volume_root += "\\"
+    return volume_root
+
+
+def query_bitlocker_state(path: Path) -> BitlockerState:
+    """Queries whether a Bitlocker drive is absent, locked, or unlocked.
+    
+    On Windows this is a single GetVolumeInformationW call: it succeeds for an unlocked volume and fails with
+    ERROR_ACCESS_DENIED for a locked one. Any other failure (e.g. not ready, path not found) means the drive is absent.
+    Elsewhere, falls back to checking the mount point and whether it is accessible.
+
+    Args:
+        path (Path): Mount point of the drive.
+
+    Returns:
+        BitlockerState: State of the drive.
+    """
+    logger.info("Querying Bitlocker state of path: %s", path)
+    if sys.platform == "win32":
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        if kernel32.GetVolumeInformationW(_volume_root(path), None, 0, None, None, None, None, 0):
+            return "unlocked"
+        return "locked" if ctypes.get_last_error() == ERROR_ACCESS_DENIED else "absent"
+    
+    if not os.path.ismount(path):
+        return "absent"
+    return "unlocked" if is_mounted(path) else "locked"
+
+
+def _volume_device_id(mount_point: Path) -> str:
+    """Resolves the volume GUID path of the volume mounted at a drive letter or folder.
+    
+    This is the `DeviceID` of the volume in WMI. Resolving it, rather than using the drive letter of the path,
+    targets the volume mounted at a folder instead of the volume that contains the folder.
+
+    Args:
+        mount_point (Path): Mount point of the volume.
+
+    Raises:
+        FileNotFoundError: If no volume is mounted at the mount point.
+
+    Returns:
+        str: Volume GUID path, e.g. `\\\\?\\Volume{GUID}\\`.
+    """
+    kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    volume_name = ctypes.create_unicode_buffer(VOLUME_NAME_LENGTH)
+    if not kernel32.GetVolumeNameForVolumeMountPointW(_volume_root(mount_point), volume_name, VOLUME_NAME_LENGTH):
+        raise FileNotFoundError(f"No volume mounted at {mount_point} (error {ctypes.get_last_error()}).")
+    return volume_name.value
+
+
+def _call_wmi_volume_method(mount_point: Path, method_name: str, *args) -> None:
+    """Calls a method of the Win32_EncryptableVolume WMI class for the volume at a mount point.
+    
+    Requires pywin32. Initializes COM for the calling thread, so it can be run in an executor.
+
+    Args:
+        mount_point (Path): Mount point of the Bitlocker drive, e.g. `E:` or a folder.
+        method_name (str): Name of the method to call.
+        *args: Arguments passed to the method.
+
+    Raises:
+        FileNotFoundError: If no encryptable volume exists at the mount point.
+        RuntimeError: If the method returns a non-zero return value.
+    """
+    import pythoncom  # Optional dependency (pywin32), only needed for WMI access
+    import win32com.client
+    
+    # WQL string literals escape backslashes
+    device_id = _volume_device_id(mount_point).replace("\\", "\\\\")
+    pythoncom.CoInitialize()
+    try:
+        locator = win32com.client.Dispatch("WbemScripting.SWbemLocator")
+        service = locator.ConnectServer(".", WMI_BITLOCKER_NAMESPACE)
+        volumes = list(service.ExecQuery(f"SELECT * FROM Win32_EncryptableVolume WHERE DeviceID = '{device_id}'"))
+        if not volumes:
+            raise FileNotFoundError(f"No encryptable volume found at {mount_point}.")
+        
+        return_value = getattr(volumes[0], method_name)(*args)
+        if return_value != 0:
+            raise RuntimeError(f"{method_name} failed for {mount_point} with return value 0x{return_value:08X}")
+    finally:
+        pythoncom.CoUninitialize()
+
+
+def bitlocker_wmi_unlock(mount_point: Path, password: str) -> None:
+    """Unlocks a Bitlocker drive through the Bitlocker WMI provider, without spawning a subprocess.
+
+    Args:
+        mount_point (Path): Mount point of the Bitlocker drive.
+        password (str): Password to unlock the Bitlocker drive.
+    """
+    logger.info("Unlocking Bitlocker drive through WMI: %s", mount_point)
+    _call_wmi_volume_method(mount_point, "UnlockWithPassphrase", password)
 
 
-async def run_command(command: List[str], print_output: bool = True) -> None:
+def bitlocker_wmi_lock(mount_point: Path) -> None:
+    """Locks a Bitlocker drive through the Bitlocker WMI provider, forcing a dismount, without spawning a subprocess.
+
+    Args:
+        mount_point (Path): Mount point of the Bitlocker drive.
+    """
+    logger.info("Locking Bitlocker drive through WMI: %s", mount_point)
+    _call_wmi_volume_method(mount_point, "Lock", True)
+
+
+def _run_in_thread(loop: "asyncio.AbstractEventLoop", function: Callable, *args) -> "asyncio.Future":
+    """Runs a blocking function on its own daemon thread, as `Popen.communicate` does for each pipe.
+    
+    Unlike the shared default executor of the loop, a call never waits for a free worker. Concurrent commands
+    therefore cannot starve each other's pipe reads, which would leave a child blocked on a full pipe.
+
+    Args:
+        loop (asyncio.AbstractEventLoop): Event loop the returned future belongs to.
+        function (Callable): Blocking function to run.
+        *args: Arguments passed to the function.
+
+    Returns:
+        asyncio.Future: Future resolved with the result of the function, or the exception it raised.
+    """
+    future = loop.create_future()
+    
+    def resolve(result, exception: Optional[BaseException]) -> None:
+        if future.done():
+            return  # Cancelled along with the awaiting command
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    
+    def run() -> None:
+        result, exception = None, None
+        try:
+            result = function(*args)
+        except BaseException as e:
+            exception = e
+        try:
+            loop.call_soon_threadsafe(resolve, result, exception)
+        except RuntimeError:
+            pass  # Event loop already closed after the command was cancelled
+    
+    threading.Thread(target=run, name="run_command_io", daemon=True).start()
+    return future
+
+
+def _pump_lines(stream: BinaryIO, sink: Callable[[str], None]) -> None:
+    """Passes each line of a blocking stream to a sink as it arrives, until the stream ends, then closes it.
+
+    Args:
+        stream (BinaryIO): Stream to read from.
+        sink (Callable[[str], None]): Called with each decoded line, without its line ending.
+    """
+    with stream:
+        for line in iter(stream.readline, b""):
+            sink(line.decode(errors="replace").rstrip("\r\n"))
+
+
+def _write_stdin(process: subprocess.Popen, stdin_data: bytes) -> None:
+    """Writes data to the stdin of a process and closes it.
+
+    Args:
+        process (subprocess.Popen): Process with piped stdin.
+        stdin_data (bytes): Data to write.
+    """
+    try:
+        process.stdin.write(stdin_data)
+        process.stdin.close()
+    except (BrokenPipeError, ConnectionResetError):
+        pass  # Command exited without reading its input; reported through the return code
+
+
+async def run_command(command: List[str], print_output: bool = True, stdin_data: Optional[bytes] = None) -> None:
     """Runs a command in an asynchronous subprocess.
+    
+    The command is killed if the call is cancelled.
 
     Args:
         command (List[str]): Command represented as a list of arguments.
         print_output (bool, optional): Whether to print the output of the command. Defaults to True.
+        stdin_data (Optional[bytes], optional): Data written to the stdin of the command. Defaults to None.
+
+    Raises:
+        RuntimeError: If the command exits with a non-zero return code.
     """
+    import asyncio  # Deferred so that the synchronous helpers don't pay for importing the event loop machinery
+    
+    loop = asyncio.get_running_loop()
+    
     # Create the subprocess, redirect the standard output into a pipe
-    process = await asyncio.create_subprocess_exec(
-        *command,
-        stdout=asyncio.subprocess.PIPE,  # Capture stdout
-        stderr=asyncio.subprocess.PIPE   # Capture stderr, if needed
-    )
-
-    stdout, stderr = await process.communicate()  # Read from stdout and stderr
+    process = await loop.run_in_executor(_SPAWN_EXECUTOR, functools.partial(
+        subprocess.Popen,
+        command,
+        stdin=subprocess.PIPE if stdin_data is not None else None,
+        stdout=subprocess.PIPE,  # Capture stdout
+        stderr=subprocess.PIPE   # Capture stderr, if needed
+    ))
+    
+    # Streams the output as it arrives rather than buffering all of it; stderr is kept for the error message
+    stderr_lines: List[str] = []
+    
+    def handle_stdout(line: str) -> None:
+        if print_output:
+            print(line)
+    
+    def handle_stderr(line: str) -> None:
+        stderr_lines.append(line)
+        if print_output:
+            print(line)
+    
+    try:
+        # Each pipe gets its own thread; lines are handed back to the loop, so they are handled in order
+        pipe_io = [
+            _run_in_thread(loop, _pump_lines, stream, functools.partial(loop.call_soon_threadsafe, handler))
+            for stream, handler in ((process.stdout, handle_stdout), (process.stderr, handle_stderr))
+        ]
+        if stdin_data is not None:
+            pipe_io.append(_run_in_thread(loop, _write_stdin, process, stdin_data))
+        await asyncio.gather(*pipe_io)
+        await _run_in_thread(loop, process.wait)
+    except BaseException:
+        # Cancelled or failed: the command is killed, which also ends the reads blocked on its pipes
+        process.kill()
+        raise
     
     if process.returncode != 0:
-        raise RuntimeError(f"Command failed: {command}\n{stderr.decode()}")
+        raise RuntimeError(f"Command failed: {command}\n" + "\n".join(stderr_lines))
 
-    # Decode and print the stdout and stderr
+
+async def run_host_script(process: "asyncio.subprocess.Process", script: str, print_output: bool = True) -> None:
+    """Runs a script in a persistent PowerShell host that reads commands from stdin.
+    
+    Completion is detected by a unique sentinel line written after the script, which also reports whether it failed.
+    The script is sent as Base64 encoded UTF-16LE, since the host decodes stdin with the console code page, which
+    would mangle non-ASCII characters such as those in a password.
+
+    Args:
+        process (asyncio.subprocess.Process): PowerShell host started with `-Command -`, stdin and stdout piped.
+        script (str): Single-line PowerShell script to run.
+        print_output (bool, optional): Whether to print the output of the script. Defaults to True.
+
+    Raises:
+        RuntimeError: If the script fails or the host exits before the script finishes.
+    """
+    # Random rather than uuid4, whose module import costs more than the rest of this module
+    sentinel = f"<<END:{os.urandom(16).hex()}>>"
+    wrapped_script = (
+        f"try {{ $ErrorActionPreference = 'Stop'; {script}; $succeeded = 1 }} "
+        f"catch {{ Write-Output $_; $succeeded = 0 }}; "
+        f"Write-Output \"{sentinel}$succeeded\""
+    )
+    encoded_script = base64.b64encode(wrapped_script.encode("utf-16-le")).decode()
+    process.stdin.write(
+        f"Invoke-Expression ([Text.Encoding]::Unicode.GetString([Convert]::FromBase64String('{encoded_script}')))\n".encode()
+    )
+    await process.stdin.drain()
+    
+    # Reads output until the sentinel line
+    output_lines = []
+    while True:
+        line = await process.stdout.readline()
+        if not line:
+            raise RuntimeError("PowerShell host exited before the script finished.")
+        decoded_line = line.decode(errors="replace").rstrip("\r\n")
+        if decoded_line.startswith(sentinel):
+            break
+        output_lines.append(decoded_line)
+    output = "\n".join(output_lines)
+    
+    if decoded_line != f"{sentinel}1":
+        raise RuntimeError(f"Script failed in PowerShell host:\n{output}")
+    
     if print_output:
-        print(stdout.decode())
-        print(stderr.decode())
+        print(output)
 
 
 # **********
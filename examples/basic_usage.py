@@ -16,10 +16,9 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 
 from bitlocker_drive_interface.bitlocker_drive import BitlockerDrive
-from bitlocker_drive_interface.utilities.exceptions import AlreadyLockedError, AlreadyUnlockedError
 
 BITLOCKER_DRIVE = BitlockerDrive(
-    powershell_executable_path = Path("path/to/powershell.exe"),
+    powershell_executable_path = None,  # Detected from PATH (pwsh preferred), or e.g. Path("path/to/pwsh.exe")
     mount_point = Path("path/to/mount/point"),
 )
 BITLOCKER_DRIVE_PASSWORD = "password"
@@ -82,17 +81,13 @@ async def unlock_bitlocker_drive(password: str) -> None:
     Args:
         password (str): Password to unlock the Bitlocker drive.
     """
-    try:
-        await BITLOCKER_DRIVE.unlock(password)
-    except AlreadyUnlockedError:
+    if not await BITLOCKER_DRIVE.ensure_unlocked(password):
         logger.warning(f"Bitlocker drive at {BITLOCKER_DRIVE.mount_point} is already unlocked. Continuing...")
     
     
 async def lock_bitlocker_drives() -> None:
     """Attempts to lock the Bitlocker drive. If the drive is already locked, the function will continue."""
-    try:
-        await BITLOCKER_DRIVE.lock()
-    except AlreadyLockedError:
+    if not await BITLOCKER_DRIVE.ensure_locked():
         logger.warning(f"Bitlocker drive at {BITLOCKER_DRIVE.mount_point} is already locked. Continuing...")
 
     
@@ -6,6 +6,7 @@
 Test cases for the bitlocker drive class.
 """
 
+import base64
 import asyncio
 from pathlib import Path
 
@@ -13,9 +14,12 @@ import unittest
 from unittest import mock
 from unittest.mock import MagicMock, PropertyMock, AsyncMock
 
-from bitlocker_drive_interface.bitlocker_drive import BitlockerDrive
+from bitlocker_drive_interface.bitlocker_drive import BitlockerDrive, _default_powershell
 from bitlocker_drive_interface.utilities.exceptions import AlreadyLockedError, AlreadyUnlockedError
 
+# The drive state is queried through the Windows volume APIs on Windows, so tests patch the query itself
+QUERY_STATE_PATH = "bitlocker_drive_interface.utilities.utilities.query_bitlocker_state"
+
 
 # ****************
 class TestBitlockerDrive(unittest.TestCase):
@@ -34,22 +38,236 @@ class TestBitlockerDrive(unittest.TestCase):
             powershell_executable_path = self.POWERSHELL_EXECUTABLE_PATH,
             mount_point = mount_path, 
         )
+    
+    
+    def tearDown(self):
+        # Detection results are cached per process
+        _default_powershell.cache_clear()
         
     
+    # ****************
+    # Initialization tests
+    def test_init_prefers_pwsh(self):
+        # Arrange
+        which_results = {"pwsh": "/fake/pwsh", "powershell": "/fake/powershell"}
+        with mock.patch('shutil.which', side_effect=which_results.get):
+            # Act
+            bitlocker_drive = BitlockerDrive(powershell_executable_path=None, mount_point=Path('/fake/mount'))
+            
+            # Assert
+            self.assertEqual(bitlocker_drive.powershell_executable_path, Path("/fake/pwsh"))
+    
+    
+    def test_init_falls_back_to_powershell(self):
+        # Arrange
+        which_results = {"powershell": "/fake/powershell"}
+        with mock.patch('shutil.which', side_effect=which_results.get):
+            # Act
+            bitlocker_drive = BitlockerDrive(powershell_executable_path=None, mount_point=Path('/fake/mount'))
+            
+            # Assert
+            self.assertEqual(bitlocker_drive.powershell_executable_path, Path("/fake/powershell"))
+    
+    
+    def test_init_positional_none_executable_uses_detection(self):
+        # Arrange
+        with mock.patch('shutil.which', return_value="/fake/pwsh"):
+            # Act
+            bitlocker_drive = BitlockerDrive(None, Path('/fake/mount'))
+            
+            # Assert
+            self.assertEqual(bitlocker_drive.powershell_executable_path, Path("/fake/pwsh"))
+    
+    
+    def test_init_requires_mount_point(self):
+        # Act
+        with self.assertRaises(TypeError):
+            BitlockerDrive(self.POWERSHELL_EXECUTABLE_PATH)
+    
+    
+    def test_init_caches_detection(self):
+        # Arrange
+        with mock.patch('shutil.which', return_value="/fake/pwsh") as mock_which:
+            # Act
+            BitlockerDrive(powershell_executable_path=None, mount_point=Path('/fake/mount'))
+            BitlockerDrive(powershell_executable_path=None, mount_point=Path('/fake/other_mount'))
+            
+            # Assert
+            mock_which.assert_called_once_with("pwsh")
+    
+    
+    def test_init_no_powershell_found(self):
+        # Arrange
+        with mock.patch('shutil.which', return_value=None):
+            # Act
+            with self.assertRaises(FileNotFoundError):
+                BitlockerDrive(powershell_executable_path=None, mount_point=Path('/fake/mount'))
+    
+    
+    def test_configuration_is_read_only(self):
+        # Act
+        for attribute in ("powershell_executable_path", "mount_point", "use_powershell", "use_wmi"):
+            with self.subTest(attribute=attribute):
+                with self.assertRaises(AttributeError):
+                    setattr(self.bitlocker_drive, attribute, None)
+        
+        # Assert
+        self.assertEqual(self.bitlocker_drive.mount_point, Path('/fake/mount'))
+    
+    
+    # ****************
+    # Persistent host tests
+    def test_start_host_reads_commands_from_stdin(self):
+        # Arrange
+        with mock.patch('asyncio.create_subprocess_exec', new=AsyncMock()) as mock_subprocess:
+            # Act
+            asyncio.run(self.bitlocker_drive.start_host())
+            
+            # Assert
+            mock_subprocess.assert_called_once()
+            self.assertEqual(mock_subprocess.call_args.args[-2:], ("-Command", "-"))
+            self.assertIsNotNone(self.bitlocker_drive._host_process)
+    
+
+    def test_start_host_concurrently(self):
+        # Arrange
+        async def create_subprocess_exec(*args, **kwargs):
+            await asyncio.sleep(0)  # Yields so the second start waits on the lock
+            return MagicMock()
+        
+        async def start_twice():
+            await asyncio.gather(self.bitlocker_drive.start_host(), self.bitlocker_drive.start_host())
+        
+        with mock.patch('asyncio.create_subprocess_exec', new=AsyncMock(side_effect=create_subprocess_exec)) as mock_subprocess:
+            # Act
+            asyncio.run(start_twice())
+            
+            # Assert
+            mock_subprocess.assert_called_once()
+    
+
+    def test_unlock_method_falls_back_when_host_closes(self):
+        # Arrange
+        self.bitlocker_drive._host_process = MagicMock()
+        
+        async def unlock_while_closing():
+            async with self.bitlocker_drive._host_lock:
+                unlock_task = asyncio.create_task(self.bitlocker_drive.unlock(self.password, print_output=False))
+                await asyncio.sleep(0)  # Lets the unlock wait on the lock
+                self.bitlocker_drive._host_process = None  # As close_host does while holding the lock
+            await unlock_task
+        
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_host_script", return_value=None) as mock_run_host_script, \
+            mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            asyncio.run(unlock_while_closing())
+            
+            # Assert
+            mock_run_host_script.assert_not_called()
+            mock_run_command.assert_called_once()
+    
+
+    def test_unlock_method_uses_host(self):
+        # Arrange
+        self.bitlocker_drive._host_process = MagicMock()
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_host_script", return_value=None) as mock_run_host_script, \
+            mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            asyncio.run(self.bitlocker_drive.unlock(self.password, print_output=False))
+            
+            # Assert
+            mock_run_host_script.assert_called_once()
+            mock_run_command.assert_not_called()
+    
+    
+    def test_unlock_method_host_quotes_password(self):
+        # Arrange
+        self.bitlocker_drive._host_process = MagicMock()
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_host_script", return_value=None) as mock_run_host_script, \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            asyncio.run(self.bitlocker_drive.unlock("it's $secret`", print_output=False))
+            
+            # Assert
+            script = mock_run_host_script.call_args.args[1]
+            self.assertIn("-String ('it''s $secret`')", script)
+    
+    
+    def test_unlock_method_host_quotes_typographic_quotes(self):
+        # Arrange
+        self.bitlocker_drive._host_process = MagicMock()
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_host_script", return_value=None) as mock_run_host_script, \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            asyncio.run(self.bitlocker_drive.unlock("it’s ‘x‚‛", print_output=False))
+            
+            # Assert
+            script = mock_run_host_script.call_args.args[1]
+            self.assertIn("-String ('it’’s ‘‘x‚‚‛‛')", script)
+    
+    
+    def test_close_host(self):
+        # Arrange
+        mock_process = MagicMock()
+        mock_process.stdin.drain = AsyncMock()
+        mock_process.wait = AsyncMock()
+        self.bitlocker_drive._host_process = mock_process
+        
+        # Act
+        asyncio.run(self.bitlocker_drive.close_host())
+        
+        # Assert
+        mock_process.stdin.write.assert_called_once_with(b"exit\n")
+        mock_process.wait.assert_awaited_once()
+        self.assertIsNone(self.bitlocker_drive._host_process)
+    
+    
+    def test_close_host_concurrently(self):
+        # Arrange
+        async def drain():
+            await asyncio.sleep(0)  # Yields so the second close waits on the lock
+        
+        mock_process = MagicMock()
+        mock_process.stdin.drain = AsyncMock(side_effect=drain)
+        mock_process.wait = AsyncMock()
+        self.bitlocker_drive._host_process = mock_process
+        
+        async def close_twice():
+            await asyncio.gather(self.bitlocker_drive.close_host(), self.bitlocker_drive.close_host())
+        
+        # Act
+        asyncio.run(close_twice())
+        
+        # Assert
+        mock_process.wait.assert_awaited_once()
+        self.assertIsNone(self.bitlocker_drive._host_process)
+    
+    
     # ****************
     # Prepare unlock subprocess tests
     def test_prepare_unlock_subprocess_command_setup(self):
         # Arrange
         expected_command = [
             str(self.bitlocker_drive.powershell_executable_path),
-            "-Command",
-            f'$securePassword = ConvertTo-SecureString -String "{self.password}" -AsPlainText -Force; \
-                Unlock-BitLocker -MountPoint "{self.bitlocker_drive.mount_point}" -Password $securePassword'
+            "-NoProfile",
+            "-NonInteractive",
+            "-NoLogo",
+            "-ExecutionPolicy",
+            "Bypass",
+            "-EncodedCommand",
+            base64.b64encode((
+                '$securePassword = ConvertTo-SecureString '
+                '-String ([Text.Encoding]::Unicode.GetString([Convert]::FromBase64String([Console]::In.ReadLine()))) '
+                '-AsPlainText -Force; '
+                f"Unlock-BitLocker -MountPoint '{self.bitlocker_drive.mount_point}' -Password $securePassword"
+            ).encode("utf-16-le")).decode()
         ]
 
         with mock.patch('builtins.open', mock.mock_open(read_data="ZGVjb2RlZCBwYXNzd29yZA=="), create=True) as m, \
             mock.patch('asyncio.create_subprocess_exec', new=mock.MagicMock()) as mock_subprocess, \
-            mock.patch('os.path.ismount', return_value=True):
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
             # Act
             command = self.bitlocker_drive.prepare_unlock_subprocess(self.password)
 
@@ -57,29 +275,36 @@ class TestBitlockerDrive(unittest.TestCase):
             self.assertEqual(command, expected_command)
 
 
-    def test_prepare_unlock_subprocess_command_setup_different_password(self):
+    def test_prepare_unlock_subprocess_command_excludes_password(self):
         # Arrange
-        incorrect_password = "incorrect password"
-        expected_command = [
-            str(self.bitlocker_drive.powershell_executable_path),
-            "-Command",
-            f'$securePassword = ConvertTo-SecureString -String "{self.password}" -AsPlainText -Force; \
-                Unlock-BitLocker -MountPoint "{self.bitlocker_drive.mount_point}" -Password $securePassword'
-        ]
-
-        with mock.patch('builtins.open', mock.mock_open(read_data="ZGVjb2RlZCBwYXNzd29yZA=="), create=True) as m, \
-            mock.patch('asyncio.create_subprocess_exec', new=mock.MagicMock()) as mock_subprocess, \
-            mock.patch('os.path.ismount', return_value=True):
+        with mock.patch(QUERY_STATE_PATH, return_value="locked"):
             # Act
-            command = self.bitlocker_drive.prepare_unlock_subprocess(incorrect_password)
+            command = self.bitlocker_drive.prepare_unlock_subprocess(self.password)
 
             # Assert
-            self.assertNotEqual(command, expected_command)
+            self.assertFalse(any(self.password in argument for argument in command))
                 
                 
+    def test_prepare_unlock_subprocess_command_setup_manage_bde(self):
+        # Arrange
+        bitlocker_drive = BitlockerDrive(
+            powershell_executable_path = None,
+            mount_point = Path('/fake/mount'),
+            use_powershell = False,
+        )
+        expected_command = ["manage-bde.exe", "-unlock", str(bitlocker_drive.mount_point), "-password"]
+
+        with mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            command = bitlocker_drive.prepare_unlock_subprocess(self.password)
+
+            # Assert
+            self.assertEqual(command, expected_command)
+    
+    
     def test_prepare_unlock_subprocess_no_mount_point(self):
         # Arrange
-        with mock.patch('os.path.ismount', return_value=False):
+        with mock.patch(QUERY_STATE_PATH, return_value="absent"):
             # Act
             with self.assertRaises(FileNotFoundError):
                 self.bitlocker_drive.prepare_unlock_subprocess(self.password)
@@ -87,8 +312,7 @@ class TestBitlockerDrive(unittest.TestCase):
                 
     def test_prepare_unlock_subprocess_already_unlocked(self):
         # Arrange
-        with mock.patch('os.path.ismount', return_value=True), \
-            mock.patch('pathlib.Path.exists', return_value=True):
+        with mock.patch(QUERY_STATE_PATH, return_value="unlocked"):
             # Act
             with self.assertRaises(AlreadyUnlockedError):
                 self.bitlocker_drive.prepare_unlock_subprocess(self.password)
@@ -100,7 +324,7 @@ class TestBitlockerDrive(unittest.TestCase):
     def test_unlock_method(self):
         # Arrange
         with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
-            mock.patch('os.path.ismount', return_value=True), \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"), \
             mock.patch('builtins.open', mock.mock_open(read_data="ZGVjb2RlZCBwYXNzd29yZA=="), create=True):
             # Act
             asyncio.run(self.bitlocker_drive.unlock(self.password, print_output=False))  # Not interested in print_output in the test case
@@ -109,6 +333,68 @@ class TestBitlockerDrive(unittest.TestCase):
             mock_run_command.assert_called_once()
     
     
+    def test_unlock_method_passes_password_via_stdin(self):
+        # Arrange
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            asyncio.run(self.bitlocker_drive.unlock(self.password, print_output=False))
+            
+            # Assert
+            stdin_data = mock_run_command.call_args.kwargs["stdin_data"]
+            self.assertEqual(base64.b64decode(stdin_data).decode("utf-16-le"), self.password)
+    
+    
+    def test_unlock_method_passes_non_ascii_password_via_stdin(self):
+        # Arrange
+        password = "pässwörd€"
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            asyncio.run(self.bitlocker_drive.unlock(password, print_output=False))
+            
+            # Assert
+            stdin_data = mock_run_command.call_args.kwargs["stdin_data"]
+            stdin_data.decode("ascii")  # Unaffected by the console code page
+            self.assertEqual(base64.b64decode(stdin_data).decode("utf-16-le"), password)
+    
+    
+    def test_unlock_method_uses_wmi(self):
+        # Arrange
+        bitlocker_drive = BitlockerDrive(
+            powershell_executable_path = None,
+            mount_point = Path('/fake/mount'),
+            use_wmi = True,
+        )
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.bitlocker_wmi_unlock", return_value=None) as mock_wmi_unlock, \
+            mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            asyncio.run(bitlocker_drive.unlock(self.password, print_output=False))
+            
+            # Assert
+            mock_wmi_unlock.assert_called_once_with(bitlocker_drive.mount_point, self.password)
+            mock_run_command.assert_not_called()
+    
+    
+    def test_ensure_unlocked_wmi_builds_no_command(self):
+        # Arrange
+        bitlocker_drive = BitlockerDrive(
+            powershell_executable_path = None,
+            mount_point = Path('/fake/mount'),
+            use_wmi = True,
+        )
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.bitlocker_wmi_unlock", return_value=None), \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            asyncio.run(bitlocker_drive.ensure_unlocked(self.password, print_output=False))
+            
+            # Assert
+            self.assertIsNone(bitlocker_drive.subprocess_unlock_command)
+            with self.assertRaises(RuntimeError):
+                bitlocker_drive.prepare_unlock_subprocess(self.password)
+    
+    
     def test_unlock_method_prepares_subprocess(self):
         # Arrange
         mock_subprocess_command = mock.MagicMock()
@@ -120,7 +406,7 @@ class TestBitlockerDrive(unittest.TestCase):
             return mock_subprocess_command
 
         with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
-            mock.patch('pathlib.Path.exists', return_value=True), \
+            mock.patch(QUERY_STATE_PATH, return_value="unlocked"), \
             mock.patch.object(BitlockerDrive, 'prepare_unlock_subprocess', side_effect=side_effect) as mock_prepare_unlock_subprocess:
 
             # Act
@@ -131,19 +417,72 @@ class TestBitlockerDrive(unittest.TestCase):
             mock_run_command.assert_called_once()
 
     
+    # ****************
+    # Ensure unlocked tests
+    def test_ensure_unlocked_unlocks_locked_drive(self):
+        # Arrange
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            performed = asyncio.run(self.bitlocker_drive.ensure_unlocked(self.password, print_output=False))
+            
+            # Assert
+            self.assertTrue(performed)
+            mock_run_command.assert_called_once()
+    
+    
+    def test_ensure_unlocked_raises_when_unlock_fails(self):
+        # Arrange
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", side_effect=RuntimeError("bad password")), \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            with self.assertRaises(RuntimeError):
+                asyncio.run(self.bitlocker_drive.ensure_unlocked(self.password, print_output=False))
+    
+    
+    def test_unlock_method_logs_failure(self):
+        # Arrange
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", side_effect=RuntimeError("bad password")), \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            with self.assertLogs("bitlocker_drive_interface.bitlocker_drive", level="ERROR") as logs:
+                asyncio.run(self.bitlocker_drive.unlock(self.password, print_output=False))
+            
+            # Assert
+            self.assertIn("bad password", logs.output[0])
+    
+    
+    def test_ensure_unlocked_already_unlocked(self):
+        # Arrange
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, return_value="unlocked"):
+            # Act
+            performed = asyncio.run(self.bitlocker_drive.ensure_unlocked(self.password, print_output=False))
+            
+            # Assert
+            self.assertFalse(performed)
+            mock_run_command.assert_not_called()
+    
+    
     # ****************
     # Prepare lock subprocess tests
     def test_prepare_lock_subprocess_command_setup(self):
         # Arrange
         expected_command = [
             str(self.bitlocker_drive.powershell_executable_path),
-            "-Command",
-            f'Lock-BitLocker -MountPoint "{self.bitlocker_drive.mount_point}" -ForceDismount'
+            "-NoProfile",
+            "-NonInteractive",
+            "-NoLogo",
+            "-ExecutionPolicy",
+            "Bypass",
+            "-EncodedCommand",
+            base64.b64encode(
+                f"Lock-BitLocker -MountPoint '{self.bitlocker_drive.mount_point}' -ForceDismount".encode("utf-16-le")
+            ).decode()
         ]
 
         with mock.patch('asyncio.create_subprocess_exec', new=mock.MagicMock()) as mock_subprocess, \
-            mock.patch('pathlib.Path.exists', return_value=True), \
-            mock.patch('os.path.ismount', return_value=True):
+            mock.patch(QUERY_STATE_PATH, return_value="unlocked"):
             # Act
             command = self.bitlocker_drive.prepare_lock_subprocess()
 
@@ -151,9 +490,26 @@ class TestBitlockerDrive(unittest.TestCase):
             self.assertEqual(command, expected_command)
             
     
+    def test_prepare_lock_subprocess_command_setup_manage_bde(self):
+        # Arrange
+        bitlocker_drive = BitlockerDrive(
+            powershell_executable_path = None,
+            mount_point = Path('/fake/mount'),
+            use_powershell = False,
+        )
+        expected_command = ["manage-bde.exe", "-lock", str(bitlocker_drive.mount_point), "-ForceDismount"]
+
+        with mock.patch(QUERY_STATE_PATH, return_value="unlocked"):
+            # Act
+            command = bitlocker_drive.prepare_lock_subprocess()
+
+            # Assert
+            self.assertEqual(command, expected_command)
+            
+    
     def test_prepare_lock_subprocess_no_mount_point(self):
         # Arrange
-        with mock.patch('os.path.ismount', return_value=False):
+        with mock.patch(QUERY_STATE_PATH, return_value="absent"):
             # Act
             with self.assertRaises(FileNotFoundError):
                 self.bitlocker_drive.prepare_lock_subprocess()
@@ -161,8 +517,7 @@ class TestBitlockerDrive(unittest.TestCase):
                 
     def test_prepare_lock_subprocess_already_locked(self):
         # Arrange
-        with mock.patch('pathlib.Path.exists', return_value=False), \
-            mock.patch('os.path.ismount', return_value=True):
+        with mock.patch(QUERY_STATE_PATH, return_value="locked"):
             # Act
             with self.assertRaises(AlreadyLockedError):
                 self.bitlocker_drive.prepare_lock_subprocess()
@@ -179,7 +534,7 @@ class TestBitlockerDrive(unittest.TestCase):
             return mock_subprocess_command
 
         with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
-            mock.patch('pathlib.Path.exists', return_value=True), \
+            mock.patch(QUERY_STATE_PATH, return_value="unlocked"), \
             mock.patch.object(BitlockerDrive, 'prepare_lock_subprocess', side_effect=side_effect) as mock_prepare_lock_subprocess:
 
             # Act
@@ -190,13 +545,83 @@ class TestBitlockerDrive(unittest.TestCase):
             mock_run_command.assert_called_once()
     
     
+    # ****************
+    # Ensure locked tests
+    def test_ensure_locked_locks_unlocked_drive(self):
+        # Arrange
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, return_value="unlocked"):
+            # Act
+            performed = asyncio.run(self.bitlocker_drive.ensure_locked(print_output=False))
+            
+            # Assert
+            self.assertTrue(performed)
+            mock_run_command.assert_called_once()
+    
+    
+    def test_ensure_locked_raises_when_lock_fails(self):
+        # Arrange
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", side_effect=RuntimeError("in use")), \
+            mock.patch(QUERY_STATE_PATH, return_value="unlocked"):
+            # Act
+            with self.assertRaises(RuntimeError):
+                asyncio.run(self.bitlocker_drive.ensure_locked(print_output=False))
+    
+    
+    def test_ensure_locked_already_locked(self):
+        # Arrange
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            performed = asyncio.run(self.bitlocker_drive.ensure_locked(print_output=False))
+            
+            # Assert
+            self.assertFalse(performed)
+            mock_run_command.assert_not_called()
+    
+    
     # ****************
     # Lock tests
+    def test_lock_method_uses_wmi(self):
+        # Arrange
+        bitlocker_drive = BitlockerDrive(
+            powershell_executable_path = None,
+            mount_point = Path('/fake/mount'),
+            use_wmi = True,
+        )
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.bitlocker_wmi_lock", return_value=None) as mock_wmi_lock, \
+            mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, return_value="unlocked"):
+            # Act
+            asyncio.run(bitlocker_drive.lock(print_output=False))
+            
+            # Assert
+            mock_wmi_lock.assert_called_once_with(bitlocker_drive.mount_point)
+            mock_run_command.assert_not_called()
+    
+    
+    def test_ensure_locked_wmi_builds_no_command(self):
+        # Arrange
+        bitlocker_drive = BitlockerDrive(
+            powershell_executable_path = None,
+            mount_point = Path('/fake/mount'),
+            use_wmi = True,
+        )
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.bitlocker_wmi_lock", return_value=None), \
+            mock.patch(QUERY_STATE_PATH, return_value="unlocked"):
+            # Act
+            asyncio.run(bitlocker_drive.ensure_locked(print_output=False))
+            
+            # Assert
+            self.assertIsNone(bitlocker_drive.subprocess_lock_command)
+            with self.assertRaises(RuntimeError):
+                bitlocker_drive.prepare_lock_subprocess()
+    
+    
     def test_lock_method(self):
         # Arrange
         with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
-            mock.patch('pathlib.Path.exists', return_value=True), \
-            mock.patch('os.path.ismount', return_value=True), \
+            mock.patch(QUERY_STATE_PATH, return_value="unlocked"), \
             mock.patch('builtins.open', mock.mock_open(read_data="ZGVjb2RlZCBwYXNzd29yZA=="), create=True):
             # Act
             asyncio.run(self.bitlocker_drive.lock(print_output=False))  # Not interested in print_output in the test case
@@ -205,6 +630,77 @@ class TestBitlockerDrive(unittest.TestCase):
             mock_run_command.assert_called_once()
     
     
+    # ****************
+    # Multiple drive tests
+    def test_unlock_many(self):
+        # Arrange
+        other_drive = BitlockerDrive(
+            powershell_executable_path = self.POWERSHELL_EXECUTABLE_PATH,
+            mount_point = Path('/fake/other_mount'),
+        )
+        with mock.patch.object(BitlockerDrive, 'ensure_unlocked', new=AsyncMock(return_value=True)) as mock_unlock:
+            # Act
+            results = asyncio.run(BitlockerDrive.unlock_many([(self.bitlocker_drive, self.password), (other_drive, "other password")]))
+            
+            # Assert
+            self.assertEqual(mock_unlock.await_count, 2)
+            self.assertEqual(results, [True, True])
+    
+    
+    def test_unlock_many_continues_past_failing_drive(self):
+        # Arrange
+        other_drive = BitlockerDrive(
+            powershell_executable_path = self.POWERSHELL_EXECUTABLE_PATH,
+            mount_point = Path('/fake/other_mount'),
+        )
+        states = {Path('/fake/mount'): "absent", Path('/fake/other_mount'): "locked"}
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", return_value=None) as mock_run_command, \
+            mock.patch(QUERY_STATE_PATH, side_effect=states.get):
+            # Act
+            results = asyncio.run(BitlockerDrive.unlock_many([(self.bitlocker_drive, self.password), (other_drive, "other password")]))
+            
+            # Assert
+            self.assertIsInstance(results[0], FileNotFoundError)
+            self.assertIs(results[1], True)
+            mock_run_command.assert_called_once()
+    
+    
+    def test_unlock_many_reports_failed_unlock(self):
+        # Arrange
+        other_drive = BitlockerDrive(
+            powershell_executable_path = self.POWERSHELL_EXECUTABLE_PATH,
+            mount_point = Path('/fake/other_mount'),
+        )
+        
+        async def run_command(command, print_output, stdin_data):
+            if stdin_data == self.bitlocker_drive._password_stdin_data("wrong password"):
+                raise RuntimeError("bad password")
+        
+        with mock.patch("bitlocker_drive_interface.utilities.utilities.run_command", side_effect=run_command), \
+            mock.patch(QUERY_STATE_PATH, return_value="locked"):
+            # Act
+            results = asyncio.run(BitlockerDrive.unlock_many([(self.bitlocker_drive, "wrong password"), (other_drive, self.password)]))
+            
+            # Assert
+            self.assertIsInstance(results[0], RuntimeError)
+            self.assertIs(results[1], True)
+    
+    
+    def test_lock_many(self):
+        # Arrange
+        other_drive = BitlockerDrive(
+            powershell_executable_path = self.POWERSHELL_EXECUTABLE_PATH,
+            mount_point = Path('/fake/other_mount'),
+        )
+        with mock.patch.object(BitlockerDrive, 'ensure_locked', new=AsyncMock(return_value=False)) as mock_lock:
+            # Act
+            results = asyncio.run(BitlockerDrive.lock_many([self.bitlocker_drive, other_drive]))
+            
+            # Assert
+            self.assertEqual(mock_lock.await_count, 2)
+            self.assertEqual(results, [False, False])
+    
+    
 # ****************
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+"""
+Test cases for the utilities module.
+"""
+
+import sys
+import stat
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import unittest
+from unittest import mock
+from unittest.mock import MagicMock
+
+from bitlocker_drive_interface.utilities import utilities
+
+
+# ****************
+# Emulates a PowerShell host reading Base64 encoded commands from stdin: runs "Fail-Script" as a failing script,
+# exits on "Exit-Host", and otherwise succeeds with non-UTF-8 output.
+# Each completed script is followed by its sentinel line.
+FAKE_HOST_SCRIPT = r"""
+import re, sys, base64
+for line in sys.stdin.buffer:
+    line = line.decode("ascii")  # Fails on anything a console code page could mangle
+    line = base64.b64decode(re.search(r"FromBase64String\('([^']*)'\)", line).group(1)).decode("utf-16-le")
+    sentinel = re.search(r"<<END:[0-9a-f]+>>", line).group(0)
+    if "Exit-Host" in line:
+        sys.exit(0)
+    if "Fail-Script" in line:
+        print("script error")
+        print(sentinel + "0")
+    else:
+        sys.stdout.buffer.write(b"caf\x82\n")  # OEM code page output, not valid UTF-8
+        print(sentinel + "1")
+    sys.stdout.flush()
+"""
+
+
+# ****************
+class TestRunHostScript(unittest.TestCase):
+    
+    # ****************
+    async def run_in_fake_host(self, script: str) -> None:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-c", FAKE_HOST_SCRIPT,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        try:
+            await utilities.run_host_script(process, script, print_output=False)
+        finally:
+            process.stdin.close()
+            await process.wait()
+    
+    
+    # ****************
+    def test_run_host_script_success(self):
+        # Act
+        asyncio.run(self.run_in_fake_host("Write-Output 'hello'"))
+    
+    
+    def test_run_host_script_non_ascii(self):
+        # Act
+        asyncio.run(self.run_in_fake_host("$password = 'pässwörd€'"))
+    
+    
+    def test_run_host_script_failure(self):
+        # Act
+        with self.assertRaises(RuntimeError) as context:
+            asyncio.run(self.run_in_fake_host("Fail-Script"))
+        
+        # Assert
+        self.assertIn("script error", str(context.exception))
+    
+    
+    def test_run_host_script_host_exits(self):
+        # Act
+        with self.assertRaises(RuntimeError) as context:
+            asyncio.run(self.run_in_fake_host("Exit-Host"))
+        
+        # Assert
+        self.assertIn("exited", str(context.exception))
+    
+    
+# ****************
+class TestRunCommand(unittest.TestCase):
+    
+    # ****************
+    def test_run_command_prints_stdout_and_stderr(self):
+        # Arrange
+        command = [sys.executable, "-c", "import sys; print('out'); print('err', file=sys.stderr)"]
+        with mock.patch('builtins.print') as mock_print:
+            # Act
+            asyncio.run(utilities.run_command(command))
+            
+            # Assert
+            mock_print.assert_any_call("out")
+            mock_print.assert_any_call("err")
+    
+    
+    def test_run_command_stdin_data(self):
+        # Arrange
+        command = [sys.executable, "-c", "print(input()[::-1])"]
+        with mock.patch('builtins.print') as mock_print:
+            # Act
+            asyncio.run(utilities.run_command(command, stdin_data=b"password\n"))
+            
+            # Assert
+            mock_print.assert_called_once_with("drowssap")
+    
+    
+    def test_run_command_drains_both_streams(self):
+        # Arrange
+        # Larger than a pipe buffer on both streams, which deadlocks unless they are read concurrently
+        command = [
+            sys.executable, "-c",
+            "import sys; sys.stderr.write('e' * 2**20 + '\\n'); sys.stdout.write('o' * 2**20 + '\\n')"
+        ]
+        
+        # Act
+        asyncio.run(asyncio.wait_for(utilities.run_command(command, print_output=False), timeout=30))
+    
+    
+    def test_run_command_failure_includes_stderr(self):
+        # Arrange
+        command = [sys.executable, "-c", "import sys; print('bad things', file=sys.stderr); sys.exit(3)"]
+        
+        # Act
+        with self.assertRaises(RuntimeError) as context:
+            asyncio.run(utilities.run_command(command, print_output=False))
+        
+        # Assert
+        self.assertIn("bad things", str(context.exception))
+    
+    
+    def test_run_command_spawns_on_spawn_executor(self):
+        # Arrange
+        real_popen = utilities.subprocess.Popen
+        spawn_threads = []
+        
+        def record_popen(*args, **kwargs):
+            spawn_threads.append(threading.current_thread().name)
+            return real_popen(*args, **kwargs)
+        
+        command = [sys.executable, "-c", "pass"]
+        with mock.patch.object(utilities.subprocess, 'Popen', side_effect=record_popen):
+            # Act
+            asyncio.run(utilities.run_command(command, print_output=False))
+        
+        # Assert
+        self.assertEqual(len(spawn_threads), 1)
+        self.assertTrue(spawn_threads[0].startswith("run_command_spawn"))
+    
+    
+    def test_run_command_concurrently(self):
+        # Arrange
+        # More commands than default executor workers, each filling its stderr pipe before its stdout ends
+        command = [sys.executable, "-c", "import sys; sys.stderr.write(('e' * 99 + '\\n') * 4000)"]
+        
+        async def run_concurrently():
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=2))
+            await asyncio.wait_for(
+                asyncio.gather(*(utilities.run_command(command, print_output=False) for _ in range(5))),
+                timeout=30
+            )
+        
+        # Act
+        asyncio.run(run_concurrently())
+    
+    
+    def test_run_command_kills_command_on_cancellation(self):
+        # Arrange
+        real_popen = utilities.subprocess.Popen
+        processes = []
+        
+        def record_popen(*args, **kwargs):
+            processes.append(real_popen(*args, **kwargs))
+            return processes[-1]
+        
+        command = [sys.executable, "-c", "import time; time.sleep(60)"]
+        with mock.patch.object(utilities.subprocess, 'Popen', side_effect=record_popen):
+            # Act
+            with self.assertRaises(asyncio.TimeoutError):
+                asyncio.run(asyncio.wait_for(utilities.run_command(command, print_output=False), timeout=0.5))
+        
+        # Assert
+        self.assertIsNotNone(processes[0].wait(timeout=5))
+    
+    
+# ****************
+class TestAvailableDriveLetters(unittest.TestCase):
+    
+    # ****************
+    def test_available_drive_letters_windows_drive_mask(self):
+        # Arrange
+        mock_windll = MagicMock()
+        mock_windll.kernel32.GetLogicalDrives.return_value = 0b1101  # A:, C: and D: in use
+        with mock.patch.object(utilities.sys, 'platform', "win32"), \
+            mock.patch.object(utilities.ctypes, 'windll', mock_windll, create=True), \
+            mock.patch('os.path.exists') as mock_exists:
+            # Act
+            letters = utilities.available_drive_letters()
+            
+            # Assert
+            self.assertEqual(letters, set("BEFGHIJKLMNOPQRSTUVWXYZ"))
+            mock_windll.kernel32.GetLogicalDrives.assert_called_once()
+            mock_exists.assert_not_called()
+    
+    
+    def test_available_drive_letters_other_platforms(self):
+        # Arrange
+        with mock.patch.object(utilities.sys, 'platform', "linux"), \
+            mock.patch('os.path.exists', side_effect=lambda path: path == "C:\\"):
+            # Act
+            letters = utilities.available_drive_letters()
+            
+            # Assert
+            self.assertEqual(letters, set("ABDEFGHIJKLMNOPQRSTUVWXYZ"))
+    
+    
+# ****************
+class TestQueryBitlockerState(unittest.TestCase):
+    
+    # ****************
+    def query_on_windows(self, path: str, succeeded: bool, last_error: int = 0) -> str:
+        """Queries the state with a fake kernel32 whose GetVolumeInformationW returns the given result."""
+        mock_kernel32 = MagicMock()
+        mock_kernel32.GetVolumeInformationW.return_value = int(succeeded)
+        with mock.patch.object(utilities.sys, 'platform', "win32"), \
+            mock.patch.object(utilities.ctypes, 'WinDLL', return_value=mock_kernel32, create=True), \
+            mock.patch.object(utilities.ctypes, 'get_last_error', return_value=last_error, create=True):
+            state = utilities.query_bitlocker_state(path)
+        self.volume_root = mock_kernel32.GetVolumeInformationW.call_args.args[0]
+        return state
+    
+    
+    # ****************
+    def test_query_bitlocker_state_unlocked(self):
+        # Act
+        state = self.query_on_windows("E:\\", succeeded=True)
+        
+        # Assert
+        self.assertEqual(state, "unlocked")
+    
+    
+    def test_query_bitlocker_state_locked(self):
+        # Act
+        state = self.query_on_windows("E:\\", succeeded=False, last_error=utilities.ERROR_ACCESS_DENIED)
+        
+        # Assert
+        self.assertEqual(state, "locked")
+    
+    
+    def test_query_bitlocker_state_other_error_absent(self):
+        # Arrange
+        error_not_ready = 21
+        
+        # Act
+        state = self.query_on_windows("E:\\", succeeded=False, last_error=error_not_ready)
+        
+        # Assert
+        self.assertEqual(state, "absent")
+    
+    
+    def test_query_bitlocker_state_bare_drive_uses_root(self):
+        # Act
+        self.query_on_windows("E:", succeeded=True)
+        
+        # Assert
+        self.assertEqual(self.volume_root, "E:\\")
+    
+    
+    def test_query_bitlocker_state_folder_mount_point_uses_root(self):
+        # Act
+        self.query_on_windows("D:\\mnt\\vault", succeeded=True)
+        
+        # Assert
+        self.assertEqual(self.volume_root, "D:\\mnt\\vault\\")
+    
+    
+    def test_query_bitlocker_state_other_platforms(self):
+        # Arrange
+        cases = [
+            (False, None, "absent"),
+            (True, PermissionError, "locked"),
+            (True, MagicMock(st_mode=stat.S_IFDIR), "unlocked"),
+        ]
+        for is_mount, stat_result, expected_state in cases:
+            stat_patch = {"side_effect": stat_result} if stat_result is PermissionError else {"return_value": stat_result}
+            with self.subTest(expected_state=expected_state), \
+                mock.patch.object(utilities.sys, 'platform', "linux"), \
+                mock.patch('os.path.ismount', return_value=is_mount), \
+                mock.patch('os.stat', **stat_patch):
+                # Act
+                state = utilities.query_bitlocker_state("/fake/mount")
+                
+                # Assert
+                self.assertEqual(state, expected_state)
+    
+    
+# ****************
+class TestWmiVolumeMethods(unittest.TestCase):
+    
+    # ****************
+    def setUp(self):
+        # Fakes pywin32, which is only available on Windows
+        self.volume = MagicMock()
+        self.volume.UnlockWithPassphrase.return_value = 0
+        self.volume.Lock.return_value = 0
+        self.service = MagicMock()
+        self.service.ExecQuery.return_value = [self.volume]
+        
+        self.pythoncom = MagicMock()
+        win32com_client = MagicMock()
+        win32com_client.Dispatch.return_value.ConnectServer.return_value = self.service
+        win32com = MagicMock(client=win32com_client)
+        
+        self.device_id = "\\\\?\\Volume{1234}\\"
+        patchers = [
+            mock.patch.dict(sys.modules, {
+                "pythoncom": self.pythoncom,
+                "win32com": win32com,
+                "win32com.client": win32com_client,
+            }),
+            mock.patch.object(utilities, '_volume_device_id', return_value=self.device_id),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    
+    # ****************
+    def test_wmi_unlock_queries_volume_by_device_id(self):
+        # Act
+        utilities.bitlocker_wmi_unlock(r"D:\mnt\vault", "password")
+        
+        # Assert
+        self.service.ExecQuery.assert_called_once_with(
+            r"SELECT * FROM Win32_EncryptableVolume WHERE DeviceID = '\\\\?\\Volume{1234}\\'"
+        )
+        self.volume.UnlockWithPassphrase.assert_called_once_with("password")
+        self.pythoncom.CoUninitialize.assert_called_once()
+    
+    
+    def test_wmi_lock_forces_dismount(self):
+        # Act
+        utilities.bitlocker_wmi_lock("E:")
+        
+        # Assert
+        self.volume.Lock.assert_called_once_with(True)
+    
+    
+    def test_wmi_method_failure(self):
+        # Arrange
+        self.volume.UnlockWithPassphrase.return_value = 0x80310027
+        
+        # Act
+        with self.assertRaises(RuntimeError) as context:
+            utilities.bitlocker_wmi_unlock("E:", "wrong password")
+        
+        # Assert
+        self.assertIn("0x80310027", str(context.exception))
+        self.pythoncom.CoUninitialize.assert_called_once()
+    
+    
+    def test_wmi_no_volume(self):
+        # Arrange
+        self.service.ExecQuery.return_value = []
+        
+        # Act
+        with self.assertRaises(FileNotFoundError):
+            utilities.bitlocker_wmi_lock("E:")
+    
+    
+# ****************
+class TestVolumeDeviceId(unittest.TestCase):
+    
+    # ****************
+    def test_volume_device_id(self):
+        # Arrange
+        def get_volume_name(volume_root, volume_name, length):
+            volume_name.value = "\\\\?\\Volume{1234}\\"
+            return 1
+        
+        mock_kernel32 = MagicMock()
+        mock_kernel32.GetVolumeNameForVolumeMountPointW.side_effect = get_volume_name
+        with mock.patch.object(utilities.ctypes, 'WinDLL', return_value=mock_kernel32, create=True):
+            # Act
+            device_id = utilities._volume_device_id("D:\\mnt\\vault")
+            
+            # Assert
+            self.assertEqual(device_id, "\\\\?\\Volume{1234}\\")
+            self.assertEqual(mock_kernel32.GetVolumeNameForVolumeMountPointW.call_args.args[0], "D:\\mnt\\vault\\")
+    
+    
+    def test_volume_device_id_not_mounted(self):
+        # Arrange
+        mock_kernel32 = MagicMock()
+        mock_kernel32.GetVolumeNameForVolumeMountPointW.return_value = 0
+        with mock.patch.object(utilities.ctypes, 'WinDLL', return_value=mock_kernel32, create=True), \
+            mock.patch.object(utilities.ctypes, 'get_last_error', return_value=2, create=True):
+            # Act
+            with self.assertRaises(FileNotFoundError):
+                utilities._volume_device_id("X:")
+    
+    
+# ****************
+if __name__ == '__main__':
+    unittest.main()